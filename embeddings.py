@@ -5,21 +5,215 @@ Handles embedding generation using OpenAI's text-embedding-3-large and storage i
 """
 
 import os
+import functools
+import hashlib
 import chromadb
-from typing import List, Dict
+import torch
+import diskcache
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, Union
 from sentence_transformers import SentenceTransformer
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+ONNX_MODEL_DIR = Path("./onnx_models/all-MiniLM-L6-v2")
+ADD_BATCH_SIZE = 256
+# HNSW index settings: cosine distance, denser graph and wider beams than Chroma's defaults
+COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+
+class OnnxSentenceEncoder:
+    """
+    Int8-quantized ONNX Runtime version of all-MiniLM-L6-v2.
+
+    Exposes the subset of SentenceTransformer.encode used by MemoryEmbeddings. The model
+    is exported and quantized once, then loaded from ONNX_MODEL_DIR on later runs.
+    """
+
+    def __init__(self, model_dir: Path = ONNX_MODEL_DIR, max_seq_length: int = 256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        quantized_path = model_dir / "model_int8.onnx"
+        if not quantized_path.exists():
+            self._export(model_dir, quantized_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(str(quantized_path), providers=['CPUExecutionProvider'])
+        self.input_names = {inp.name for inp in self.session.get_inputs()}
+        self.max_seq_length = max_seq_length
+
+    @staticmethod
+    def _export(model_dir: Path, quantized_path: Path):
+        """Export the PyTorch model to ONNX and apply dynamic int8 weight quantization."""
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        from transformers import AutoTokenizer
+
+        model_dir.mkdir(parents=True, exist_ok=True)
+        ORTModelForFeatureExtraction.from_pretrained(EMBEDDING_MODEL, export=True).save_pretrained(model_dir)
+        AutoTokenizer.from_pretrained(EMBEDDING_MODEL).save_pretrained(model_dir)
+        quantize_dynamic(str(model_dir / "model.onnx"), str(quantized_path), weight_type=QuantType.QInt8)
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               show_progress_bar: bool = False, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = True) -> np.ndarray:
+        """
+        Encode one text (returns shape (D,)) or a list of texts (returns shape (N, D)).
+
+        Embeddings are L2-normalized by default, matching the Normalize module at the end of
+        the all-MiniLM-L6-v2 SentenceTransformer pipeline.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            inputs = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over non-padding tokens, as in the sentence-transformers model
+            mask = tokens['attention_mask'][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled)
+
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 384), dtype=np.float32)
+        if normalize_embeddings:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+class CompiledSentenceTransformer(SentenceTransformer):
+    """SentenceTransformer with a torch.compile'd transformer that reverts to eager mode if compiled execution fails."""
+
+    def compile_transformer(self):
+        # dynamic=True avoids recompiling for every (batch, seq_len) shape seen by encode
+        self[0].auto_model = torch.compile(self[0].auto_model, dynamic=True)
+
+    def encode(self, *args, **kwargs):
+        try:
+            return super().encode(*args, **kwargs)
+        except torch._dynamo.exc.TorchDynamoException as e:
+            # Only compile/trace failures (including BackendCompilerFailed) switch to eager; other
+            # errors such as CUDA OOM or bad arguments are raised as-is
+            eager = getattr(self[0].auto_model, '_orig_mod', None)
+            if eager is None:
+                raise
+            print(f"torch.compile failed, using eager embedding model: {e}")
+            self[0].auto_model = eager
+            return super().encode(*args, **kwargs)
+
+
+def load_embedding_model():
+    """
+    Load the local embedding model.
+
+    Uses SentenceTransformer in FP16 on a CUDA GPU (compiled with torch.compile), otherwise the
+    int8 ONNX encoder on CPU when ONNX Runtime and Optimum are installed, otherwise
+    SentenceTransformer on CPU.
+    """
+    if torch.cuda.is_available():
+        model = CompiledSentenceTransformer(EMBEDDING_MODEL, device='cuda').half()
+        model.compile_transformer()
+        # Trigger compilation now rather than on the first real request
+        model.encode(["warmup"])
+        return model
+    try:
+        return OnnxSentenceEncoder()
+    except ImportError:
+        return SentenceTransformer(EMBEDDING_MODEL)
+    except Exception as e:
+        # e.g. the first-run export failed without network access
+        print(f"ONNX encoder unavailable, using SentenceTransformer: {e}")
+        return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def embedding_backend_tag(model) -> str:
+    """Describe the backend, device and precision of an embedding model, e.g. 'torch-cuda-fp16'."""
+    if isinstance(model, OnnxSentenceEncoder):
+        return 'onnx-int8'
+    dtype = next(model.parameters()).dtype
+    precision = {torch.float16: 'fp16', torch.bfloat16: 'bf16', torch.float32: 'fp32'}.get(dtype, str(dtype))
+    return f"torch-{model.device.type}-{precision}"
+
 
 class MemoryEmbeddings:
-    def __init__(self, db_path: str = "./chroma_store"):
+    def __init__(self, db_path: str = "./chroma_store", cache_path: str = "./embed_cache"):
         self.client = chromadb.PersistentClient(path=db_path)
-        self.collection = self.client.get_or_create_collection(name="memories")
-        # Initialize sentence transformer model for local embeddings
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.collection = self.client.get_or_create_collection(name="memories", metadata=COLLECTION_METADATA)
+        # Initialize local embedding model (quantized ONNX when available)
+        self.model = load_embedding_model()
+        # Tag cache keys with the backend, device and precision so their embeddings never mix
+        self.model_tag = f"{EMBEDDING_MODEL}:{embedding_backend_tag(self.model)}:f32"
+        # On-disk cache of embeddings keyed by content hash, stored as raw float32 bytes
+        self._cache = diskcache.Cache(cache_path)
+        # In-memory LRU in front of the disk cache for repeated queries
+        self._embed_text = functools.lru_cache(maxsize=1024)(self._embed_text_uncached)
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest() + ":" + self.model_tag
+
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        entry = self._cache.get(key)
+        return np.frombuffer(entry, dtype=np.float32) if entry is not None else None
+
+    def _cache_set(self, key: str, embedding: np.ndarray):
+        # float32 bytes are lossless and far smaller than a pickled list of Python floats
+        self._cache[key] = np.asarray(embedding, dtype=np.float32).tobytes()
+
+    def _embed_text_uncached(self, text: str) -> Tuple[float, ...]:
+        key = self._cache_key(text)
+        embedding = self._cache_get(key)
+        if embedding is None:
+            embedding = np.asarray(self.model.encode(text), dtype=np.float32)
+            self._cache_set(key, embedding)
+        return tuple(embedding.tolist())
 
     def generate_embedding(self, text: str) -> List[float]:
-        """Generate embeddings for the given text using local SentenceTransformer."""
-        return self.model.encode(text).tolist()
+        """Generate embeddings for the given text, reusing a cached embedding when available."""
+        return list(self._embed_text(text))
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode many texts at once, returning an (N, D) array in input order.
+
+        Cached texts are read from disk and only the misses are encoded. Misses are
+        sorted by length before encoding so each batch pads to a similar sequence
+        length, then the rows are put back in the original order.
+        """
+        keys = [self._cache_key(text) for text in texts]
+        cached = [self._cache_get(key) for key in keys]
+        misses = [i for i, embedding in enumerate(cached) if embedding is None]
+
+        if misses:
+            order = np.argsort([len(texts[i]) for i in misses], kind='stable')
+            encoded = self.model.encode(
+                [texts[misses[j]] for j in order],
+                batch_size=64,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+            for j, embedding in zip(order, encoded):
+                i = misses[j]
+                cached[i] = np.asarray(embedding, dtype=np.float32)
+                self._cache_set(keys[i], embedding)
+
+        return np.asarray(cached, dtype=np.float32)
 
     def add_memories(self, memories: List[Dict]):
         """
@@ -30,22 +224,13 @@ class MemoryEmbeddings:
         if not memories:
             return  # No memories to add
 
-        # Get existing count to generate unique IDs
-        try:
-            existing_count = len(self.collection.get(limit=10000)['ids'])  # Get all existing IDs
-        except:
-            existing_count = 0
-
+        documents = [memory['content'] for memory in memories]
         ids = []
-        documents = []
         metadatas = []
-        embeddings_list = []
 
-        for i, memory in enumerate(memories):
-            embedding = self.generate_embedding(memory['content'])
-            embeddings_list.append(embedding)
-            ids.append(f"memory_{existing_count + i}")
-            documents.append(memory['content'])
+        for memory in memories:
+            # Random IDs are unique without querying the collection for its size
+            ids.append(f"memory_{uuid.uuid4().hex}")
             metadata = {
                 'filename': memory['filename'],
                 'source_type': memory['source_type'],
@@ -57,27 +242,46 @@ class MemoryEmbeddings:
             metadata = {k: v for k, v in metadata.items() if v is not None}
             metadatas.append(metadata)
 
-        self.collection.add(
-            embeddings=embeddings_list,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        # Encode in batches and hand each one to a single writer thread, so batch k is
+        # written to ChromaDB while batch k+1 is being embedded. Each batch is committed
+        # separately, so if anything fails every batch already submitted is deleted again
+        # before the error is re-raised; a retried upload then doesn't create duplicates.
+        submitted = 0
+        try:
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                pending = None
+                for start in range(0, len(memories), ADD_BATCH_SIZE):
+                    end = start + ADD_BATCH_SIZE
+                    embeddings_list = self.encode_batch(documents[start:end]).tolist()
+                    # Stop before queueing more work if the previous write failed
+                    if pending is not None:
+                        pending.result()
+                    pending = writer.submit(
+                        self.collection.add,
+                        embeddings=embeddings_list,
+                        documents=documents[start:end],
+                        metadatas=metadatas[start:end],
+                        ids=ids[start:end]
+                    )
+                    submitted = end
+                pending.result()
+        except Exception:
+            if submitted:
+                self.collection.delete(ids=ids[:submitted])
+            raise
 
     def search_memories(self, query: str, n_results: int = 5) -> List[Dict]:
         """Search for the top n most relevant memories based on the query."""
         query_embedding = self.generate_embedding(query)
         results = self.collection.query(
             query_embeddings=[query_embedding],
-            n_results=n_results
+            n_results=n_results,
+            include=['documents', 'metadatas', 'distances']
         )
 
-        memories = []
-        for i in range(len(results['documents'][0])):
-            memories.append({
-                'content': results['documents'][0][i],
-                'metadata': results['metadatas'][0][i],
-                'distance': results['distances'][0][i]
-            })
-
-        return memories
+        # Results are parallel lists, one entry per match for the single query
+        documents, metadatas, distances = results['documents'][0], results['metadatas'][0], results['distances'][0]
+        return [
+            {'content': document, 'metadata': metadata, 'distance': distance}
+            for document, metadata, distance in zip(documents, metadatas, distances)
+        ]
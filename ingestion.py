@@ -8,56 +8,123 @@ Handles the ingestion of uploaded files: text, audio, and images.
 """
 
 import os
+import multiprocessing
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import BinaryIO, Dict, List, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from transformers import pipeline
 from PIL import Image
 import io
 from docx import Document
-
-# Initialize local image captioning pipeline
-captioner = pipeline("image-to-text", model="Salesforce/blip-image-captioning-base")
+from .utils import extract_year_from_content, gpu_pipeline_kwargs
+
+# Local model pipelines, loaded once on first use and shared across calls
+_CAPTIONER = None
+_TRANSCRIBER = None
+# Worker pool for parsing text and Word documents, started once on first use
+_PARSE_POOL = None
+_PARSE_POOL_WORKERS = 0
+
+def _get_captioner():
+    """Return the shared BLIP image captioning pipeline."""
+    global _CAPTIONER
+    if _CAPTIONER is None:
+        _CAPTIONER = pipeline("image-to-text", model="Salesforce/blip-image-captioning-base", **gpu_pipeline_kwargs())
+    return _CAPTIONER
+
+def _get_transcriber():
+    """Return the shared Whisper speech recognition pipeline."""
+    global _TRANSCRIBER
+    if _TRANSCRIBER is None:
+        _TRANSCRIBER = pipeline("automatic-speech-recognition", model="openai/whisper-base", chunk_length_s=30,
+                                **gpu_pipeline_kwargs())
+    return _TRANSCRIBER
+
+def _get_parse_pool(n_documents: int) -> ProcessPoolExecutor:
+    """Return the shared document parsing pool, with at most one worker per document."""
+    global _PARSE_POOL, _PARSE_POOL_WORKERS
+    workers = min(n_documents, os.cpu_count() or 1)
+    if _PARSE_POOL is None or _PARSE_POOL_WORKERS < workers:
+        if _PARSE_POOL is not None:
+            _PARSE_POOL.shutdown(wait=False)
+        # forkserver, not fork: this process may already be running torch, tokenizer or CUDA
+        # threads, and forking a multi-threaded process can deadlock the workers
+        _PARSE_POOL = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver')
+        )
+        _PARSE_POOL_WORKERS = workers
+    return _PARSE_POOL
+
+def _discard_parse_pool():
+    """Drop a broken parsing pool so the next call starts a fresh one."""
+    global _PARSE_POOL, _PARSE_POOL_WORKERS
+    if _PARSE_POOL is not None:
+        _PARSE_POOL.shutdown(wait=False)
+        _PARSE_POOL = None
+        _PARSE_POOL_WORKERS = 0
+_PARSE_POOL_WORKERS = 0
 
 def process_text_file(file_path: Path) -> str:
     """Read and return the content of a text file."""
+    return process_text_bytes(file_path.read_bytes())
+
+def process_text_bytes(data: bytes) -> str:
+    """Decode and return the content of an uploaded text file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return data.decode('utf-8')
     except UnicodeDecodeError:
-        # If UTF-8 fails, try with latin-1 or other encoding
-        with open(file_path, 'r', encoding='latin-1') as f:
-            return f.read()
+        # If UTF-8 fails, fall back to latin-1, which maps every byte so nothing is lost
+        return data.decode('latin-1')
 
-def process_word_file(file_path: Path) -> str:
-    """Read and return the content of a Word document."""
+def process_word_file(file_path: Union[Path, BinaryIO]) -> str:
+    """Read and return the content of a Word document from a path or file-like object."""
     doc = Document(file_path)
     full_text = []
     for paragraph in doc.paragraphs:
         full_text.append(paragraph.text)
     return '\n'.join(full_text)
 
+def process_word_bytes(data: bytes) -> str:
+    """Read and return the content of an uploaded Word document."""
+    return process_word_file(io.BytesIO(data))
+
 def process_audio_file(file_path: Path) -> str:
     """Transcribe an audio file using local Whisper model."""
     try:
-        # Initialize Whisper pipeline for automatic speech recognition
-        transcriber = pipeline("automatic-speech-recognition", model="openai/whisper-base")
-        
         # Transcribe the audio
-        result = transcriber(str(file_path))
+        result = _get_transcriber()(str(file_path))
         transcription = result["text"]
         
         return f"Audio transcription: {transcription}"
     except Exception as e:
         return f"Audio transcription failed: {str(e)}. This is a placeholder for audio content."
 
+def process_audio_files_batch(file_paths: List[Path]) -> List[str]:
+    """Transcribe several audio files in one batched Whisper call."""
+    try:
+        results = _get_transcriber()([str(p) for p in file_paths], batch_size=8)
+        return [f"Audio transcription: {result['text']}" for result in results]
+    except Exception:
+        # Fall back to one file at a time so a single bad file doesn't fail the batch
+        return [process_audio_file(p) for p in file_paths]
+
+def process_image_files_batch(file_paths: List[Path]) -> List[str]:
+    """Generate captions for several images in one batched BLIP call."""
+    # Load images
+    images = [Image.open(p).convert('RGB') for p in file_paths]
+
+    # Generate captions using local model
+    results = _get_captioner()(images, batch_size=16)
+    return [
+        f"This image shows: {result[0]['generated_text']}. This appears to be a personal memory captured in a photograph."
+        for result in results
+    ]
+
 def process_image_file(file_path: Path) -> str:
     """Generate a caption for an image using local BLIP model."""
-    # Load image
-    image = Image.open(file_path)
-
-    # Generate caption using local model
-    caption = captioner(image)[0]['generated_text']
-    return f"This image shows: {caption}. This appears to be a personal memory captured in a photograph."
+    return process_image_files_batch([file_path])[0]
 
 def ingest_files(uploaded_files: List[Tuple[str, bytes, str, str]]) -> List[Dict]:
     """
@@ -73,8 +140,12 @@ def ingest_files(uploaded_files: List[Tuple[str, bytes, str, str]]) -> List[Dict
     uploads_dir = Path("uploads")
     uploads_dir.mkdir(exist_ok=True)
 
+    # Save media files first so they can be processed in batches; text and Word
+    # documents are parsed straight from the uploaded bytes without touching disk
+    saved = []
     for filename, file_data, source_type, description in uploaded_files:
         file_path = None
+        unique_filename = None
 
         # For images and audio, save to uploads directory
         if source_type in ['image', 'audio']:
@@ -83,20 +154,57 @@ def ingest_files(uploaded_files: List[Tuple[str, bytes, str, str]]) -> List[Dict
             with open(file_path, 'wb') as f:
                 f.write(file_data)
 
-        # Save file temporarily to process
-        temp_path = Path(f"temp_{filename}")
-        with open(temp_path, 'wb') as f:
-            f.write(file_data)
+        saved.append((filename, file_data, source_type, description, file_path, unique_filename))
+
+    # Parse text and Word documents in worker processes while the GPU models run here
+    document_parsers = {'text': process_text_bytes, 'word': process_word_bytes}
+    document_indices = [i for i, entry in enumerate(saved) if entry[2] in document_parsers]
+    document_futures = {}
+    if len(document_indices) > 1:
+        try:
+            parse_pool = _get_parse_pool(len(document_indices))
+            document_futures = {
+                i: parse_pool.submit(document_parsers[saved[i][2]], saved[i][1])
+                for i in document_indices
+            }
+        except BrokenProcessPool:
+            # Parse inline below instead
+            _discard_parse_pool()
+            document_futures = {}
+
+    # Transcribe all audio files in a single batched call
+    audio_indices = [i for i, entry in enumerate(saved) if entry[2] == 'audio']
+    batched_content = {}
+    if audio_indices:
+        transcriptions = process_audio_files_batch([saved[i][4] for i in audio_indices])
+        batched_content.update(zip(audio_indices, transcriptions))
+
+    # Caption all images in a single batched call; if the batch fails, images are
+    # retried one at a time below so only the broken file is dropped
+    image_indices = [i for i, entry in enumerate(saved) if entry[2] == 'image']
+    if image_indices:
+        try:
+            captions = process_image_files_batch([saved[i][4] for i in image_indices])
+            batched_content.update(zip(image_indices, captions))
+        except Exception as e:
+            print(f"Batched image captioning failed, falling back to per-file: {e}")
 
+    for i, (filename, file_data, source_type, description, file_path, unique_filename) in enumerate(saved):
         try:
-            if source_type == 'text':
-                content = process_text_file(temp_path)
-            elif source_type == 'word':
-                content = process_word_file(temp_path)
-            elif source_type == 'audio':
-                content = process_audio_file(temp_path)
+            if i in batched_content:
+                content = batched_content[i]
+            elif i in document_futures:
+                try:
+                    content = document_futures[i].result()
+                except BrokenProcessPool:
+                    # The pool died; parse this and the remaining documents in this process
+                    _discard_parse_pool()
+                    document_futures.clear()
+                    content = document_parsers[source_type](file_data)
+            elif source_type in document_parsers:
+                content = document_parsers[source_type](file_data)
             elif source_type == 'image':
-                content = process_image_file(temp_path)
+                content = process_image_file(file_path)
             else:
                 continue  # Skip unsupported types
 
@@ -109,8 +217,8 @@ def ingest_files(uploaded_files: List[Tuple[str, bytes, str, str]]) -> List[Dict
                 'filename': filename,
                 'source_type': source_type,
                 'upload_time': datetime.now().isoformat(),
-                'year': None,  # Can be extracted later if needed
-                'file_path': unique_filename if file_path else None
+                'year': extract_year_from_content(content),
+                'file_path': unique_filename
             }
             memories.append(memory)
         except Exception as e:
@@ -118,9 +226,5 @@ def ingest_files(uploaded_files: List[Tuple[str, bytes, str, str]]) -> List[Dict
             # Clean up saved image/audio file if processing failed
             if file_path and file_path.exists():
                 file_path.unlink()
-        finally:
-            # Clean up temp file
-            if temp_path.exists():
-                temp_path.unlink()
 
     return memories
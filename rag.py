@@ -5,9 +5,11 @@ Handles Retrieval-Augmented Generation: retrieve relevant memories and generate
 """
 
 import os
+import re
 from typing import List, Dict
 from transformers import pipeline
 from .embeddings import MemoryEmbeddings
+from .utils import gpu_pipeline_kwargs
 
 PERSONA_PROMPT = """
 You are the Living Memory Vault — an AI archivist who answers based only on the user's memories.
@@ -15,11 +17,28 @@ Be warm, nostalgic, and factual. Cite the filename or year when referencing memo
 If something is imagined, clearly mark it as imagined.
 """
 
+# Word stems that signal the user is asking about photos or recordings; matched as prefixes so
+# inflections like 'photos', 'showing', 'played' or 'voices' count too
+_IMAGE_STEMS = ('photo', 'image', 'picture', 'show', 'display')
+_AUDIO_STEMS = ('audio', 'sound', 'recording', 'play', 'listen', 'music', 'voice')
+
+# Token budget for memory context, leaving room for the question within FLAN-T5's 512-token input
+CONTEXT_TOKEN_BUDGET = 400
+
+# Local text generation pipeline, loaded once on first use and shared by all RAGSystem instances
+_GENERATOR = None
+
+def _get_generator():
+    """Return the shared FLAN-T5 text generation pipeline."""
+    global _GENERATOR
+    if _GENERATOR is None:
+        _GENERATOR = pipeline('text2text-generation', model='google/flan-t5-base', **gpu_pipeline_kwargs())
+    return _GENERATOR
+
 class RAGSystem:
     def __init__(self, embeddings: MemoryEmbeddings):
         self.embeddings = embeddings
-        # Initialize local text generation pipeline
-        self.generator = pipeline('text2text-generation', model='google/flan-t5-base')
+        self.generator = _get_generator()
 
     def retrieve_memories(self, query: str, n_results: int = 5) -> List[Dict]:
         """Retrieve the top n relevant memories for the query."""
@@ -39,17 +58,26 @@ class RAGSystem:
         audio_memories = [mem for mem in retrieved_memories if mem['metadata'].get('source_type') == 'audio']
         other_memories = [mem for mem in retrieved_memories if mem['metadata'].get('source_type') not in ['image', 'audio']]
 
-        # Build context from non-media memories
-        context = "\n".join([
-            f"Memory from {mem['metadata']['filename']} ({mem['metadata']['source_type']}): {mem['content']}"
-            for mem in other_memories
-        ])
+        # Tokenize the query once for intent checks
+        query_words = set(re.findall(r'\w+', query.lower()))
+        asks_for_images = any(word.startswith(_IMAGE_STEMS) for word in query_words)
+        asks_for_audio = any(word.startswith(_AUDIO_STEMS) for word in query_words)
 
+        # Build context from non-media memories, truncating each one to its share of the token budget.
         # If asking about images or audio, don't include their descriptions in context
-        if image_memories and any(word in query.lower() for word in ['photo', 'image', 'picture', 'show', 'display']):
-            context = "The user is asking about images/photos in their memories."
-        elif audio_memories and any(word in query.lower() for word in ['audio', 'sound', 'recording', 'play', 'listen', 'music', 'voice']):
-            context = "The user is asking about audio recordings in their memories."
+        context_parts = []
+        if image_memories and asks_for_images:
+            context_parts.append("The user is asking about images/photos in their memories.")
+        elif audio_memories and asks_for_audio:
+            context_parts.append("The user is asking about audio recordings in their memories.")
+        elif other_memories:
+            tokenizer = self.generator.tokenizer
+            per_memory_budget = max(CONTEXT_TOKEN_BUDGET // len(other_memories), 1)
+            for mem in other_memories:
+                snippet = f"Memory from {mem['metadata']['filename']} ({mem['metadata']['source_type']}): {mem['content']}"
+                ids = tokenizer(snippet, truncation=True, max_length=per_memory_budget).input_ids
+                context_parts.append(tokenizer.decode(ids, skip_special_tokens=True))
+        context = "\n".join(context_parts)
 
         # Create a simpler prompt for better FLAN-T5 performance
         prompt = f"Question: {query}\nContext: {context}\nAnswer:"
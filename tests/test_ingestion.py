@@ -0,0 +1,30 @@
+from ..ingestion import process_text_bytes
+
+
+def test_utf8_with_ascii_prefix_keeps_later_characters():
+    data = ('a' * 5000 + ' café').encode('utf-8')
+    assert process_text_bytes(data) == 'a' * 5000 + ' café'
+
+
+def test_utf8_multibyte_character_across_4kb_boundary():
+    text = 'a' * 4095 + 'é' + ' done'
+    assert process_text_bytes(text.encode('utf-8')) == text
+
+
+def test_short_latin1_text_falls_back_to_latin1():
+    assert process_text_bytes('Hello café'.encode('latin-1')) == 'Hello café'
+
+
+def test_latin1_french_text():
+    text = "Ça va? Très bien, merci. Nous étions à la plage en été."
+    assert process_text_bytes(text.encode('latin-1')) == text
+
+
+def test_latin1_german_text():
+    text = 'Grüße aus München, schöne Straße.'
+    assert process_text_bytes(text.encode('latin-1')) == text
+
+
+def test_other_single_byte_encodings_keep_every_byte():
+    data = ('Привет мир, как дела? ' * 3).encode('cp1251')
+    assert process_text_bytes(data).encode('latin-1') == data
@@ -0,0 +1,62 @@
+import timeit
+
+import pytest
+
+from .. import utils
+
+YEAR_INPUTS = [
+    'in 1999 we moved',
+    'x1999',
+    '1999',
+    '2023.',
+    '20233',
+    'ab 2005_',
+    'é2001',
+    'a-1987-b',
+    'no year here',
+    '19',
+    'born 2019 and 1990',
+    'born—1985',
+    '\xa02015 trip',
+    '«1990»',
+    '2020é',
+    '2020—',
+    'code 19x 2021',
+    '日本 2012年',
+    'under 200 then 1975',
+    'I have 20 apples and 19 pears. ' * 50 + 'in 2004',
+    '19٨٥ and then',
+    '20\u0661\u0662 ok',
+    '1999é',
+    'é20',
+    '20a',
+    'x' * 5000 + ' 1988',
+    'y' * 5000 + '—2011',
+]
+
+
+@pytest.mark.parametrize('content', YEAR_INPUTS)
+def test_scan_matches_regex(content):
+    assert utils._extract_year_scan(content) == utils._extract_year_regex(content)
+
+
+@pytest.mark.parametrize('content', YEAR_INPUTS)
+def test_extract_year_from_content_matches_regex(content):
+    assert utils.extract_year_from_content(content) == utils._extract_year_regex(content)
+
+
+def test_scan_not_slower_than_regex_on_long_text():
+    # Number-heavy text has many '19'/'20' pairs that are not years; they must be rejected
+    # inside the scanner rather than each going back to Python
+    if utils.njit is None:
+        pytest.skip('numba not installed')
+    content = 'I have 20 apples and 19 pears. ' * 5000
+    utils._extract_year_scan(content)  # compile outside the timing
+    scan = min(timeit.repeat(lambda: utils._extract_year_scan(content), number=5, repeat=3))
+    regex = min(timeit.repeat(lambda: utils._extract_year_regex(content), number=5, repeat=3))
+    assert scan <= regex * 1.5
+
+
+def test_extract_year_from_content():
+    assert utils.extract_year_from_content('born—1985') == 1985
+    assert utils.extract_year_from_content('x1999') is None
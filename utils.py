@@ -5,16 +5,107 @@ Utility functions for the Living Memory Vault.
 """
 
 import re
+import numpy as np
 from typing import Optional, Dict
 
-def extract_year_from_content(content: str) -> Optional[int]:
-    """Extract a year from the content using regex."""
-    year_pattern = r'\b(19|20)\d{2}\b'
-    match = re.search(year_pattern, content)
-    if match:
-        return int(match.group())
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+_YEAR_RE = re.compile(r'\b(?:19|20)\d{2}\b')
+
+# Below this many characters, a single regex search is faster than calling into the scanner
+_SCAN_MIN_LENGTH = 4096
+
+def _is_ascii_word_byte(c) -> bool:
+    """Return True for bytes of ASCII word characters: letters, digits and underscore."""
+    return (0x30 <= c <= 0x39) or (0x41 <= c <= 0x5A) or (0x61 <= c <= 0x7A) or c == 0x5F
+
+def _find_year_candidate(b, start: int):
+    """
+    Scan a uint8 array of UTF-8 bytes from start for a '19xx'/'20xx' year.
+
+    Returns (offset, year). A year of -1 means there is none; 0 means a candidate at offset
+    touches a non-ASCII byte and must be confirmed with _YEAR_RE, since only the decoded
+    character can say whether it is a word character or a digit. Candidates made entirely
+    of ASCII bytes are decided here with the same \\b and \\d rules as the regex.
+    """
+    n = b.shape[0]
+    for i in range(start, n - 1):
+        c0 = b[i]
+        c1 = b[i + 1]
+        if not ((c0 == 0x31 and c1 == 0x39) or (c0 == 0x32 and c1 == 0x30)):
+            continue
+        if i + 3 >= n:
+            # No room for two more digits: a non-ASCII digit needs at least two bytes
+            continue
+        prev_ambiguous = i > 0 and b[i - 1] >= 0x80
+        if i > 0 and _is_ascii_word_byte(b[i - 1]):
+            continue
+        c2 = b[i + 2]
+        c3 = b[i + 3]
+        if c2 >= 0x80 or c3 >= 0x80:
+            if c2 < 0x80 and not (0x30 <= c2 <= 0x39):
+                continue
+            return i, 0
+        if not (0x30 <= c2 <= 0x39 and 0x30 <= c3 <= 0x39):
+            continue
+        if i + 4 < n:
+            c4 = b[i + 4]
+            if c4 >= 0x80:
+                return i, 0
+            if _is_ascii_word_byte(c4):
+                continue
+        if prev_ambiguous:
+            return i, 0
+        return i, (int(c0) - 0x30) * 1000 + (int(c1) - 0x30) * 100 + (int(c2) - 0x30) * 10 + (int(c3) - 0x30)
+    return -1, -1
+
+if njit is not None:
+    _is_ascii_word_byte = njit(cache=True)(_is_ascii_word_byte)
+    _find_year_candidate = njit(cache=True)(_find_year_candidate)
+
+def _extract_year_regex(content: str) -> Optional[int]:
+    match = _YEAR_RE.search(content)
+    return int(match.group()) if match else None
+
+def _extract_year_scan(content: str) -> Optional[int]:
+    data = content.encode('utf-8')
+    b = np.frombuffer(data, dtype=np.uint8)
+    i, year = _find_year_candidate(b, 0)
+    while i >= 0:
+        if year > 0:
+            return year
+        # Confirm a non-ASCII candidate with the regex on a small decoded window. 4 bytes
+        # before covers the whole preceding character; 16 after covers the digits and the
+        # following character
+        start = max(i - 4, 0)
+        offset = len(data[start:i].decode('utf-8', errors='ignore'))
+        match = _YEAR_RE.match(data[start:i + 16].decode('utf-8', errors='ignore'), offset)
+        if match:
+            return int(match.group())
+        i, year = _find_year_candidate(b, i + 1)
     return None
 
+def extract_year_from_content(content: str) -> Optional[int]:
+    """
+    Extract a year from the content.
+
+    Long content is scanned with a Numba byte scanner when numba is installed; short content
+    and installs without numba use the regex, which is faster below _SCAN_MIN_LENGTH.
+    """
+    if njit is None or len(content) < _SCAN_MIN_LENGTH:
+        return _extract_year_regex(content)
+    return _extract_year_scan(content)
+
+def gpu_pipeline_kwargs() -> Dict:
+    """Return pipeline kwargs that run a model on the GPU in FP16 when CUDA is available."""
+    import torch
+    if torch.cuda.is_available():
+        return {'device': 0, 'torch_dtype': torch.float16}
+    return {}
+
 def format_memory_for_display(memory: Dict) -> str:
     """Format a memory dict for display in the UI."""
     return f"**{memory['metadata']['filename']}** ({memory['metadata']['source_type']}, {memory['metadata']['upload_time'][:10]}): {memory['content'][:200]}..."